@@ -0,0 +1,327 @@
+"""
+Micro-benchmarks for the parser hot functions, using fragments of the example USDocML.
+
+    python -m benchmarks.micro            # compare against the baseline
+    python -m benchmarks.micro --save     # overwrite the baseline with this run
+
+Each function is compared to a calibration loop timed in the same process, so the
+baseline can be reused on machines of different speeds.
+"""
+
+import contextlib
+import gc
+import io
+import json
+import re
+import statistics
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from reaper_usdocml import parse_lua as lua
+from reaper_usdocml import tslua as ts
+from reaper_usdocml import usdocml_to_ts
+from reaper_usdocml.parse_doc import BadElement, DocBloc, RawBloc, parse_attrs
+from reaper_usdocml.patches import apply_patches, load_patches
+
+ROOT = Path(__file__).parent.parent
+INPUT_PATH = ROOT / "example" / "Reaper_Api_Documentation.USDocML"
+REPLACEMENTS_PATH = ROOT / "example" / "replacements.json"
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+# the same tags that are repaired by parse_usdocml
+BAD_TAGS = ["description", "parameters", "functioncall", "retvals", "deprecated", "changelog"]
+
+# use every N-th bloc of the document, so fragments cover all chapters
+BLOC_STRIDE = 10
+
+
+class Fragments(NamedTuple):
+    """Real inputs for each benchmarked function, extracted from the example file"""
+
+    attrs: list[str]
+    bloc_texts: list[str]
+    functioncalls: list
+    func_params: list[str]
+    declarations: list[ts.FunctionDeclaration]
+    custom_types: list[ts.CustomType]
+    namespaces: list[ts.Namespace]
+
+
+def extract_fragments() -> Fragments:
+    with open(INPUT_PATH, "r", encoding="utf8", newline="") as f:
+        input_text = f.read()
+
+    parts, _ = apply_patches(input_text, load_patches(REPLACEMENTS_PATH))
+    raw_blocs = [x for x in parts if isinstance(x, RawBloc)][::BLOC_STRIDE]
+
+    bloc_texts = [x.text for x in raw_blocs]
+
+    attrs_pattern = f"<(?:{'|'.join(BAD_TAGS)})([^/>]*?)/?>"
+    attrs = [m.group(1) for x in bloc_texts for m in re.finditer(attrs_pattern, x)]
+
+    blocs = [DocBloc.parse(x) for x in raw_blocs]
+
+    functioncalls = []
+    func_params = []
+    for bloc in blocs:
+        fc_element = bloc.element.find('functioncall[@prog_lang="lua"]')
+        if fc_element is None:
+            continue
+
+        try:
+            fc = lua.FunctionCall.from_element(fc_element)
+        except lua.ParseError:
+            continue
+
+        functioncalls.append(fc_element)
+        func_params.extend(str(p) for p in fc.params)
+
+    # the conversion prints errors for blocs that fail to parse, they're skipped anyway
+    with contextlib.redirect_stdout(io.StringIO()):
+        custom_types, namespaces = usdocml_to_ts(blocs)
+
+    declarations = [f for n in namespaces for f in n.functions]
+
+    return Fragments(
+        attrs,
+        bloc_texts,
+        functioncalls,
+        func_params,
+        declarations,
+        custom_types,
+        namespaces,
+    )
+
+
+def benchmarks(fragments: Fragments) -> dict[str, Callable[[], None]]:
+    """Each benchmark runs its function once over all of its fragments"""
+
+    def bench_parse_attrs():
+        for x in fragments.attrs:
+            parse_attrs(x)
+
+    def bench_parse_text():
+        for x in fragments.bloc_texts:
+            BadElement.parse_text(x, BAD_TAGS)
+
+    def bench_fix():
+        for x in fragments.bloc_texts:
+            BadElement.fix(x, BAD_TAGS)
+
+    def bench_from_element():
+        for x in fragments.functioncalls:
+            lua.FunctionCall.from_element(x)
+
+    def bench_func_param_parse():
+        for x in fragments.func_params:
+            lua.FuncParam.parse(x)
+
+    def bench_function_declaration():
+        for x in fragments.declarations:
+            x.function_declaration()
+
+    def bench_to_typescriptlua():
+        ts.to_typescriptlua(fragments.custom_types, fragments.namespaces)
+
+    return {
+        "parse_attrs": bench_parse_attrs,
+        "BadElement.parse_text": bench_parse_text,
+        "BadElement.fix": bench_fix,
+        "lua.FunctionCall.from_element": bench_from_element,
+        "lua.FuncParam.parse": bench_func_param_parse,
+        "FunctionDeclaration.function_declaration": bench_function_declaration,
+        "to_typescriptlua": bench_to_typescriptlua,
+    }
+
+
+def calibration_loop():
+    """
+    A fixed workload of string, regex and tuple operations, similar to the parsers.
+    Benchmarks are reported relative to it, so the speed of the machine cancels out.
+    """
+
+    for i in range(500):
+        text = f"optional integer param{i} - the description of param {i}"
+        match = re.match(r"(?:optional\s+)?(\w+)\s+(\w+)\s*-(.*)", text)
+        assert match is not None
+        parts = text.split()
+        "".join(parts).replace("param", "arg")
+        tuple(x.strip() for x in match.groups())
+
+
+def calibrate(func: Callable[[], None], min_time: float) -> int:
+    """Find how many calls are needed for a timed run to take at least min_time"""
+
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start >= min_time:
+            return number
+        number *= 2
+
+
+def best_of(func: Callable[[], None], number: int, samples: int) -> float:
+    """Returns the minimum time of a single call over several timed runs"""
+
+    timings: list[float] = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return min(timings)
+
+
+class Result(NamedTuple):
+    # median over rounds of the minimum time of a single call, in seconds
+    time: float
+    # median over rounds of time / calibration loop time, measured in the same round
+    ratio: float
+
+
+def measure(
+    func: Callable[[], None],
+    warmup: int,
+    rounds: int,
+    samples: int,
+    min_time: float,
+):
+    for _ in range(warmup):
+        func()
+
+    # fast functions are called several times per timed run, to reduce timer noise
+    number = calibrate(func, min_time)
+    calibration_number = calibrate(calibration_loop, min_time)
+
+    times: list[float] = []
+    ratios: list[float] = []
+
+    # like timeit, don't let garbage collection pauses skew the timings
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            # the minimum of a few runs filters out interruptions by other processes,
+            # the median over rounds filters out rounds where the machine was slowed down
+            func_time = best_of(func, number, samples)
+            calibration_time = best_of(calibration_loop, calibration_number, samples)
+            times.append(func_time)
+            ratios.append(func_time / calibration_time)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return Result(statistics.median(times), statistics.median(ratios))
+
+
+def parse_args():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "-b",
+        "--baseline",
+        type=Path,
+        default=BASELINE_PATH,
+        help="path to the baseline JSON file",
+    )
+    parser.add_argument(
+        "--save",
+        action="store_true",
+        help="write the results to the baseline file instead of comparing against it",
+    )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="fail if a time relative to the calibration loop exceeds the baseline by this fraction (default: 0.25)",
+    )
+    parser.add_argument(
+        "-w",
+        "--warmup",
+        type=int,
+        default=3,
+        help="number of untimed runs before timing (default: 3)",
+    )
+    parser.add_argument(
+        "-n",
+        "--rounds",
+        type=int,
+        default=5,
+        help="number of rounds, the median over rounds is reported (default: 5)",
+    )
+    parser.add_argument(
+        "-s",
+        "--samples",
+        type=int,
+        default=3,
+        help="number of timed runs per round, the minimum is kept (default: 3)",
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.2,
+        help="minimum duration of a timed run in seconds (default: 0.2)",
+    )
+    parser.add_argument(
+        "-k",
+        "--filter",
+        help="only run benchmarks whose name contains this string",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    fragments = extract_fragments()
+
+    results: dict[str, Result] = {}
+    for name, func in benchmarks(fragments).items():
+        if args.filter is not None and args.filter not in name:
+            continue
+
+        results[name] = measure(
+            func,
+            args.warmup,
+            args.rounds,
+            args.samples,
+            args.min_time,
+        )
+
+    if args.save:
+        with open(args.baseline, "w", encoding="utf8") as f:
+            json.dump({k: v._asdict() for k, v in results.items()}, f, indent=2)
+            f.write("\n")
+
+    baseline: dict[str, dict[str, float]] = {}
+    if not args.save and args.baseline.exists():
+        with open(args.baseline, "r", encoding="utf8") as f:
+            baseline = json.load(f)
+
+    regressions = 0
+    for name, result in results.items():
+        time_ms = result.time * 1000
+        line = f"{name:<42} {time_ms:9.3f} ms ({result.ratio:8.3f}x calibration)"
+
+        # compare against the calibration loop, so a slower machine isn't a regression
+        if name in baseline:
+            ratio = result.ratio / baseline[name]["ratio"]
+            line += f"  {ratio - 1:+7.1%}"
+            if ratio > 1 + args.threshold:
+                line += "  REGRESSION"
+                regressions += 1
+
+        print(line)
+
+    if regressions > 0:
+        print(f"[ERROR] {regressions} benchmark(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,33 @@
-import json
+import os
+import sys
 import textwrap
 import xml.etree.ElementTree as ET
 from argparse import ArgumentParser
 from pathlib import Path
 from typing import Optional
 
+from . import lint
 from . import parse_lua as lua
 from . import tslua as ts
-from .parse_doc import parse_usdocml
+from .parse_doc import DocBloc, RawBloc
+from .patches import apply_patches, load_patches
+from .source_map import write_source_map
 
 
 def parse_args():
     parser = ArgumentParser()
     parser.add_argument("input", type=Path, help="path to the .usdocml file")
-    parser.add_argument("output", type=Path, help="path to the output .d.ts file")
+    parser.add_argument(
+        "output",
+        type=Path,
+        nargs="?",
+        help="path to the output .d.ts file, not used with --lint",
+    )
     parser.add_argument(
         "-r",
         "--replacements",
         type=Path,
-        help="path to an optional JSON file containing string replacements for the input file",
+        help="path to an optional JSON file containing string replacements for the input file, either global or scoped to a bloc slug",
     )
     parser.add_argument(
         "-w",
@@ -26,39 +35,84 @@ def parse_args():
         type=Path,
         help="path to an optional output usdocml path with the string replacements applied",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "-v",
+        "--patch-report",
+        action="store_true",
+        help="print the hit count of every replacement rule, not only the rules that matched nothing",
+    )
+    parser.add_argument(
+        "-m",
+        "--source-map",
+        type=Path,
+        help="path to the output source map, mapping declarations to lines in the input file (default: <output>.map.json)",
+    )
+    parser.add_argument(
+        "--no-source-map",
+        action="store_true",
+        help="don't write a source map",
+    )
+
+    lint_group = parser.add_argument_group(
+        "lint",
+        "check that the input parses cleanly and write a JSON report, without generating declarations",
+    )
+    lint_group.add_argument(
+        "--lint",
+        action="store_true",
+        help="lint the input instead of generating declarations",
+    )
+    lint_group.add_argument(
+        "--report",
+        type=Path,
+        help="path to write the JSON lint report to (default: stdout)",
+    )
+    lint_group.add_argument(
+        "-b",
+        "--baseline",
+        type=Path,
+        help="path to a previous lint report, only errors not found in it cause a failure",
+    )
+    lint_group.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of lint worker processes (default: number of CPUs)",
+    )
 
+    args = parser.parse_args()
+    if not args.lint and args.output is None:
+        parser.error("the following arguments are required: output")
 
-def usdocml_to_ts_declaration(root: ET.Element):
-    assert root.tag == "USDocBloc", "expected document root tag to be 'USDocBloc'"
+    return args
 
-    custom_types: dict[str, ts.CustomType] = {}
-    namespaces: dict[str, ts.Namespace] = {}
 
-    def sanitise_type_name(name: str) -> str:
-        return name.replace(".", "_")
+def sanitise_doc(doc: Optional[str]) -> Optional[str]:
+    if doc is None:
+        return None
 
-    def sanitise_param_name(name: str) -> str:
-        if name in {"in", "function"}:
-            return f"_{name}"
+    # preemptively remove "comment end" symbols, since this seems like the kind
+    # of shit USDocML will eventually devolve to
+    doc = doc.replace("*/", "* /").strip()
+    if len(doc) == 0:
+        return None
 
-        return name.replace(".", "_")
+    return doc
+
+
+def usdocml_to_ts(blocs: list[DocBloc]):
+    custom_types: dict[str, ts.CustomType] = {}
+    namespaces: dict[str, ts.Namespace] = {}
 
     def get_type(x: str) -> str:
         # handle standard types
-        if x in {"int", "integer", "number"}:
-            return "number"
-        elif x == "string":
-            return "string"
-        elif x == "boolean":
-            return "boolean"
-        elif x == "table":
-            return "object"
-        elif x == "function":
-            return "Function"
+        native = ts.native_type(x)
+        if native is not None:
+            return native
 
         # handle custom opaque type
-        x = sanitise_type_name(x)
+        x = ts.sanitise_type_name(x)
         if x in custom_types:
             return x
         else:
@@ -66,18 +120,20 @@ def usdocml_to_ts_declaration(root: ET.Element):
             custom_types[x] = ct
             return x
 
-    for docbloc in root:
-        assert docbloc.tag == "US_DocBloc"
+    for bloc in blocs:
+        docbloc = bloc.element
 
         # parse the Lua function call
         fc_element = docbloc.find('functioncall[@prog_lang="lua"]')
         if fc_element is None:
             continue
 
+        fc_pos = bloc.raw.locate("functioncall", "lua")
+
         try:
             fc = lua.FunctionCall.from_element(fc_element)
         except lua.ParseError as e:
-            print(f"[ERROR] {e}")
+            print(f"[ERROR] {fc_pos}: {e}")
             continue
 
         # find and parse the description
@@ -87,10 +143,6 @@ def usdocml_to_ts_declaration(root: ET.Element):
 
         if description is not None:
             description = textwrap.dedent(description)
-            # preemptively remove "comment end" symbols, since this seems like the kind
-            # of shit USDocML will eventually devolve to
-            description = description.replace("*/", "* /")
-            description = description.strip()
             description = "\n\n".join(
                 [
                     line.strip()
@@ -98,26 +150,17 @@ def usdocml_to_ts_declaration(root: ET.Element):
                     if len(line.strip()) > 0
                 ]
             )
-            if len(description) == 0:
-                description = None
+            description = sanitise_doc(description)
 
         # find and parse the deprecated
         deprecated = docbloc.find("deprecated")
         if deprecated is not None:
-            deprecated = deprecated.attrib.get("alternative", None)
-
-        if deprecated is not None:
-            # preemptively remove "comment end" symbols, since this seems like the kind
-            # of shit USDocML will eventually devolve to
-            deprecated = deprecated.replace("*/", "* /")
-            deprecated = deprecated.strip()
-            if len(deprecated) == 0:
-                deprecated = None
+            deprecated = sanitise_doc(deprecated.attrib.get("alternative", None))
 
         # determine if the function belongs to a namespace or a class method
         if fc.namespace.startswith("{") and fc.namespace.endswith("}"):
             # class method
-            class_name = sanitise_type_name(fc.namespace[1:-1])
+            class_name = ts.sanitise_type_name(fc.namespace[1:-1])
             if class_name not in custom_types:
                 custom_types[class_name] = ts.CustomType(class_name, [])
 
@@ -129,12 +172,31 @@ def usdocml_to_ts_declaration(root: ET.Element):
             namespace = namespaces[fc.namespace]
             target = namespace.functions
 
+        # match the <parameters> and <retvals> descriptions to the function call
         params = [
-            ts.Param(get_type(p.type), sanitise_param_name(p.name), p.optional)
+            ts.Param(
+                get_type(p.type),
+                ts.sanitise_param_name(p.name),
+                p.optional,
+                sanitise_doc(bloc.parameters.get(p.name)),
+            )
             for p in fc.params
         ]
         retvals: list[str] = [get_type(rt.type) for rt in fc.retvals]
 
+        return_docs: list[tuple[str, str]] = []
+        for i, rt in enumerate(fc.retvals):
+            doc = None
+            if rt.name is not None:
+                doc = bloc.retvals.get(rt.name)
+            elif len(fc.retvals) == 1 and len(bloc.retvals) == 1:
+                # the return value is unnamed, e.g. 'boolean reaper.Foo()'
+                doc = next(iter(bloc.retvals.values()))
+
+            doc = sanitise_doc(doc)
+            if doc is not None:
+                return_docs.append((rt.name or f"retval{i + 1}", doc))
+
         declaration = ts.FunctionDeclaration(
             fc.name,
             description,
@@ -142,13 +204,17 @@ def usdocml_to_ts_declaration(root: ET.Element):
             params,
             retvals,
             fc.varargs,
+            fc_pos,
+            return_docs,
         )
         target.append(declaration)
 
-    return ts.to_typescriptlua(
-        list(custom_types.values()),
-        list(namespaces.values()),
-    )
+    return list(custom_types.values()), list(namespaces.values())
+
+
+def usdocml_to_ts_declaration(blocs: list[DocBloc]):
+    custom_types, namespaces = usdocml_to_ts(blocs)
+    return ts.to_typescriptlua(custom_types, namespaces)
 
 
 def main():
@@ -159,31 +225,59 @@ def main():
     replacements_path: Optional[Path] = args.replacements
     replaced_path: Optional[Path] = args.write_replaced
 
+    if args.lint:
+        sys.exit(
+            lint.main(
+                input_path,
+                replacements_path,
+                args.report,
+                args.baseline,
+                args.jobs,
+            )
+        )
+
+    if args.no_source_map:
+        source_map_path = None
+    elif args.source_map is not None:
+        source_map_path = args.source_map
+    else:
+        source_map_path = output_path.with_name(f"{output_path.name}.map.json")
+
     # read the shitty xml
-    with open(input_path, "r", encoding="utf8") as f:
+    # keep line endings as-is, so byte offsets match the input file
+    with open(input_path, "r", encoding="utf8", newline="") as f:
         input_text = f.read()
 
     # apply fixes if provided
-    if replacements_path is not None:
-        with open(replacements_path, "r", encoding="utf8") as f:
-            replacements_json = json.load(f)
-
-        assert isinstance(replacements_json, dict), "replacements must be a dictionary"
-        for src, dst in replacements_json.items():
-            assert isinstance(src, str), "dictionary key must be a string"
-            assert isinstance(dst, str), "dictionary value must be a string"
-
-            input_text = input_text.replace(src, dst)
-
-        # write optional fixed XML
-        if replaced_path is not None:
-            with open(replaced_path, "w", encoding="utf8") as f:
-                f.write(input_text)
+    rules = [] if replacements_path is None else load_patches(replacements_path)
+    parts, report = apply_patches(input_text, rules)
+
+    for x in report:
+        if x.hits == 0:
+            print(f"[WARN] replacement matched nothing: {x.rule}")
+        elif args.patch_report:
+            print(f"[PATCH] {x.hits} hit(s): {x.rule}")
+
+    # write optional fixed XML
+    if replacements_path is not None and replaced_path is not None:
+        with open(replaced_path, "w", encoding="utf8", newline="") as f:
+            f.write(RawBloc.join(parts))
+
+    # parse the fixed xml, one bloc at a time
+    blocs: list[DocBloc] = []
+    for x in parts:
+        if isinstance(x, str):
+            continue
 
-    # parse the fixed xml
-    root = parse_usdocml(input_text)
+        try:
+            blocs.append(DocBloc.parse(x))
+        except ET.ParseError as e:
+            print(f"[ERROR] {x.pos}: {e}")
 
     # convert to typescript declarations
-    ts_declaration = usdocml_to_ts_declaration(root)
+    ts_declaration, mappings = usdocml_to_ts_declaration(blocs)
     with open(output_path, "w", encoding="utf8") as f:
         f.write(ts_declaration)
+
+    if source_map_path is not None:
+        write_source_map(source_map_path, input_path, output_path, mappings)
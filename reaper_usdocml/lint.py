@@ -0,0 +1,192 @@
+import json
+import re
+import sys
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Literal, NamedTuple, Optional
+
+from . import parse_lua as lua
+from . import tslua as ts
+from .parse_doc import DocBloc, RawBloc
+from .patches import PatchHit, PatchRule, apply_patches, load_patches
+from .source_map import SourcePos
+
+Level = Literal["error", "warning"]
+
+# a custom type must be a valid TS identifier after sanitising
+TS_IDENTIFIER = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]*")
+
+
+class Diagnostic(NamedTuple):
+    """A problem found in the input file"""
+
+    rule: str
+    level: Level
+    message: str
+    slug: Optional[str]
+    # None if the problem isn't tied to a position in the input file
+    line: Optional[int]
+    offset: Optional[int]
+
+    @classmethod
+    def at(cls, rule: str, level: Level, message: str, pos: SourcePos):
+        return cls(rule, level, message, pos.slug, pos.line, pos.offset)
+
+    def fingerprint(self):
+        """Identifies this problem across doc drops, where line numbers may change"""
+
+        return (self.rule, self.slug, self.message)
+
+    def to_json(self):
+        return self._asdict()
+
+    @classmethod
+    def from_json(cls, obj: dict):
+        return cls(**obj)
+
+    def __str__(self) -> str:
+        if self.line is None:
+            location = self.slug or "*"
+        else:
+            location = f"{self.slug} (line {self.line}, byte {self.offset})"
+
+        return f"[{self.level.upper()}] {self.rule}: {location}: {self.message}"
+
+
+def lint_bloc(raw: RawBloc) -> list[Diagnostic]:
+    try:
+        bloc = DocBloc.parse(raw)
+    except ET.ParseError as e:
+        return [Diagnostic.at("xml-parse-error", "error", str(e), raw.pos)]
+    except (AssertionError, ValueError) as e:
+        # attributes that BadElement can't repair, don't let them abort the whole run
+        message = f"failed to parse bloc: {str(e) or type(e).__name__}"
+        return [Diagnostic.at("xml-parse-error", "error", message, raw.pos)]
+
+    fc_element = bloc.element.find('functioncall[@prog_lang="lua"]')
+    if fc_element is None:
+        return []
+
+    fc_pos = raw.locate("functioncall", "lua")
+
+    try:
+        fc = lua.FunctionCall.from_element(fc_element)
+    except lua.ParseError as e:
+        return [Diagnostic.at("lua-parse-error", "error", str(e), fc_pos)]
+
+    result: list[Diagnostic] = []
+
+    params = [
+        ts.Param(p.type, ts.sanitise_param_name(p.name), p.optional)
+        for p in fc.params
+    ]
+    try:
+        ts.Param.validate_order(params)
+    except ts.TranspileError as e:
+        result.append(Diagnostic.at("param-order", "error", str(e), fc_pos))
+
+    types = [p.type for p in fc.params] + [rt.type for rt in fc.retvals]
+    for typ in types:
+        if ts.native_type(typ) is not None:
+            continue
+        if TS_IDENTIFIER.fullmatch(ts.sanitise_type_name(typ)):
+            continue
+
+        message = f"unknown type {typ!r}"
+        result.append(Diagnostic.at("unknown-type", "error", message, fc_pos))
+
+    return result
+
+
+def lint_blocs(blocs: list[RawBloc]) -> list[Diagnostic]:
+    result: list[Diagnostic] = []
+    for raw in blocs:
+        result.extend(lint_bloc(raw))
+    return result
+
+
+def lint_patches(report: list[PatchHit]) -> list[Diagnostic]:
+    result: list[Diagnostic] = []
+    for x in report:
+        if x.hits > 0:
+            continue
+
+        message = f"replacement matched nothing: {x.rule.find!r}"
+        result.append(
+            Diagnostic("unused-replacement", "warning", message, x.rule.slug, None, None)
+        )
+    return result
+
+
+def lint(text: str, rules: list[PatchRule], jobs: int) -> list[Diagnostic]:
+    parts, report = apply_patches(text, rules)
+    blocs = [x for x in parts if isinstance(x, RawBloc)]
+
+    result = lint_patches(report)
+
+    if jobs <= 1:
+        result.extend(lint_blocs(blocs))
+    else:
+        # a few large chunks per worker, to keep pickling overhead low
+        chunk_size = max(1, len(blocs) // (jobs * 4))
+        chunks = [blocs[i : i + chunk_size] for i in range(0, len(blocs), chunk_size)]
+        with ProcessPoolExecutor(jobs) as executor:
+            for x in executor.map(lint_blocs, chunks):
+                result.extend(x)
+
+    return result
+
+
+def main(
+    input_path: Path,
+    replacements_path: Optional[Path],
+    output_path: Optional[Path],
+    baseline_path: Optional[Path],
+    jobs: int,
+):
+    with open(input_path, "r", encoding="utf8", newline="") as f:
+        input_text = f.read()
+
+    rules = [] if replacements_path is None else load_patches(replacements_path)
+
+    diagnostics = lint(input_text, rules, jobs)
+
+    known = set()
+    if baseline_path is not None:
+        with open(baseline_path, "r", encoding="utf8") as f:
+            baseline_json = json.load(f)
+
+        assert isinstance(baseline_json, dict), "baseline must be a lint report"
+        for x in baseline_json["diagnostics"]:
+            known.add(Diagnostic.from_json(x).fingerprint())
+
+    new_errors = [
+        x for x in diagnostics if x.level == "error" and x.fingerprint() not in known
+    ]
+
+    report = {
+        "source": input_path.name,
+        "errors": sum(1 for x in diagnostics if x.level == "error"),
+        "warnings": sum(1 for x in diagnostics if x.level == "warning"),
+        "new_errors": len(new_errors),
+        "diagnostics": [x.to_json() for x in diagnostics],
+    }
+
+    if output_path is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(output_path, "w", encoding="utf8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    # human-readable summary goes to stderr, so stdout stays valid JSON
+    for x in new_errors:
+        print(x, file=sys.stderr)
+
+    if len(new_errors) > 0:
+        print(f"[ERROR] {len(new_errors)} new error(s)", file=sys.stderr)
+        return 1
+
+    return 0
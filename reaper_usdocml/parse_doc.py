@@ -2,8 +2,11 @@ import html
 import re
 import xml.etree.ElementTree as ET
 from dataclasses import dataclass
+from functools import cached_property
 from typing import Optional, Union
 
+from .source_map import SourcePos
+
 
 def parse_attrs(attrs: str):
     result = {}
@@ -135,6 +138,157 @@ class BadElement:
         return "".join(result)
 
 
+@dataclass
+class RawBloc:
+    """The unparsed text of a single <US_DocBloc> element"""
+
+    slug: Optional[str]
+    # the bloc text, with replacements applied
+    text: str
+    # the bloc text, as found in the input file
+    original: str
+    # position of the bloc start tag in the input file
+    pos: SourcePos
+
+    @classmethod
+    def split_text(cls, text: str):
+        # blocs are never nested, so a non-greedy match is enough to find the end tag
+        pattern = re.compile(r"<US_DocBloc\b[^>]*>.*?</US_DocBloc>", re.DOTALL)
+
+        # track the line number and byte offset of the current match
+        line = 1
+        offset = 0
+
+        # split the text into:
+        #     [text, bloc, text, bloc, ...]
+        result: list[Union[str, cls]] = []
+        prev_span: tuple[int, int] = (0, 0)
+        for match in pattern.finditer(text):
+            span = match.span()
+
+            # add text between last match and this match
+            between = text[prev_span[-1] : span[0]]
+            result.append(between)
+            line += between.count("\n")
+            offset += len(between.encode("utf8"))
+
+            bloc_text = match.group(0)
+            slug_match = re.search(r"<slug>(.*?)</slug>", bloc_text)
+            slug = None if slug_match is None else slug_match.group(1).strip()
+
+            pos = SourcePos(slug, line, offset)
+            result.append(cls(slug, bloc_text, bloc_text, pos))
+            line += bloc_text.count("\n")
+            offset += len(bloc_text.encode("utf8"))
+
+            prev_span = span
+
+        # add text after last match
+        result.append(text[prev_span[-1] :])
+
+        return result
+
+    @staticmethod
+    def join(parts: list[Union[str, "RawBloc"]]):
+        return "".join([x if isinstance(x, str) else x.text for x in parts])
+
+    def locate(self, tag: str, prog_lang: Optional[str] = None) -> SourcePos:
+        """
+        Find the position of a child element in the input file. Falls back to the
+        position of the bloc if the element cannot be found.
+        """
+
+        if prog_lang is None:
+            pattern = rf"<{tag}\b"
+        else:
+            pattern = rf'<{tag}\b[^>]*prog_lang="{re.escape(prog_lang)}"'
+
+        match = re.search(pattern, self.original)
+        if match is None:
+            return self.pos
+
+        before = self.original[: match.start()]
+        return SourcePos(
+            self.slug,
+            self.pos.line + before.count("\n"),
+            self.pos.offset + len(before.encode("utf8")),
+        )
+
+
+# the first line of an item in <parameters> or <retvals>:
+#     'optional number pos - the position in seconds'
+ITEM_DOC_PATTERN = re.compile(
+    r"(?:optional\s+)?[A-Za-z_{][\w.|{}]*\s+(?P<name>[A-Za-z_][\w.]*)\s*-(?P<doc>.*)"
+)
+
+
+def parse_item_docs(text: str) -> dict[str, str]:
+    """
+    Parse the text of a <parameters> or <retvals> element into a description for each
+    item. Lines that don't start a new item are continuations of the previous item.
+    """
+
+    result: dict[str, list[str]] = {}
+    current: Optional[list[str]] = None
+
+    for line in text.splitlines():
+        line = line.strip()
+        if len(line) == 0:
+            continue
+
+        match = ITEM_DOC_PATTERN.fullmatch(line)
+        if match is None:
+            if current is not None:
+                current.append(line)
+            continue
+
+        current = []
+        doc = match.group("doc").strip()
+        if len(doc) > 0:
+            current.append(doc)
+
+        # keep the first description if an item is listed twice
+        result.setdefault(match.group("name"), current)
+
+    return {k: "\n".join(v) for k, v in result.items() if len(v) > 0}
+
+
+@dataclass
+class DocBloc:
+    """A parsed <US_DocBloc> element, and the raw text it was parsed from"""
+
+    raw: RawBloc
+    element: ET.Element
+
+    @classmethod
+    def parse(cls, raw: RawBloc):
+        element = parse_usdocml(raw.text)
+        assert element.tag == "US_DocBloc", "expected bloc root tag to be 'US_DocBloc'"
+
+        return cls(raw, element)
+
+    def _item_docs(self, tag: str):
+        result: dict[str, str] = {}
+        for element in self.element.iterfind(tag):
+            if element.text is None:
+                continue
+            for k, v in parse_item_docs(element.text).items():
+                result.setdefault(k, v)
+        return result
+
+    @cached_property
+    def parameters(self):
+        """Description of each parameter, from the <parameters> element"""
+
+        return self._item_docs("parameters")
+
+    @cached_property
+    def retvals(self):
+        """Description of each return value, from the <retvals> element"""
+
+        return self._item_docs("retvals")
+
+
 def print_tree(element: ET.Element, indent=0, file=None):
     base_indent = " " * (indent * 2)
 
@@ -0,0 +1,159 @@
+import json
+import re
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from .parse_doc import RawBloc
+
+
+class PatchRule(NamedTuple):
+    """A string replacement, optionally scoped to the elements of a single bloc"""
+
+    find: str
+    replace: str
+    # if None, then this replacement is applied to the whole document
+    slug: Optional[str]
+    # if None, then this replacement is applied to the whole bloc
+    elements: Optional[list[str]]
+
+    @classmethod
+    def from_json(cls, obj: dict):
+        """Parse a rule like {"slug": ..., "elements": [...], "find": ..., "replace": ...}"""
+
+        assert isinstance(obj, dict), "patch rule must be a dictionary"
+
+        find = obj.get("find")
+        replace = obj.get("replace")
+        assert isinstance(find, str), "patch rule 'find' must be a string"
+        assert isinstance(replace, str), "patch rule 'replace' must be a string"
+
+        slug = obj.get("slug")
+        assert slug is None or isinstance(slug, str), "patch rule 'slug' must be a string"
+
+        elements = obj.get("elements")
+        if elements is not None:
+            assert slug is not None, "patch rule with 'elements' must have a 'slug'"
+            assert isinstance(elements, list) and all(
+                isinstance(x, str) for x in elements
+            ), "patch rule 'elements' must be a list of strings"
+
+        return cls(find, replace, slug, elements)
+
+    def scope(self) -> str:
+        if self.slug is None:
+            return "*"
+
+        if self.elements is None:
+            return self.slug
+
+        return f"{self.slug}/{','.join(self.elements)}"
+
+    def __str__(self) -> str:
+        return f"{self.scope()}: {self.find!r} -> {self.replace!r}"
+
+    def apply(self, text: str) -> tuple[str, int]:
+        """Apply this rule to a bloc (or the whole document), returns the hit count"""
+
+        if self.elements is None:
+            hits = text.count(self.find)
+            if hits > 0:
+                text = text.replace(self.find, self.replace)
+            return text, hits
+
+        pattern = (
+            f"(?P<start><(?P<tag>{'|'.join(self.elements)})[^/>]*>)"
+            r"(?P<content>.*?)(?P<end></(?P=tag)>)"
+        )
+
+        hits = 0
+
+        def replace_content(match: re.Match):
+            nonlocal hits
+
+            content: str = match.group("content")
+            count = content.count(self.find)
+            if count == 0:
+                return match.group(0)
+
+            hits += count
+            content = content.replace(self.find, self.replace)
+            return f"{match.group('start')}{content}{match.group('end')}"
+
+        text = re.sub(pattern, replace_content, text, flags=re.DOTALL)
+        return text, hits
+
+
+class PatchHit(NamedTuple):
+    rule: PatchRule
+    hits: int
+
+
+def load_patches(path: Path) -> list[PatchRule]:
+    """
+    Load patch rules from a JSON file. Two formats are supported:
+
+    - A dictionary of `{find: replace}`, applied to the whole document
+    - A list of rule objects, see `PatchRule.from_json`
+    """
+
+    with open(path, "r", encoding="utf8") as f:
+        patches_json = json.load(f)
+
+    if isinstance(patches_json, dict):
+        rules = []
+        for src, dst in patches_json.items():
+            assert isinstance(src, str), "dictionary key must be a string"
+            assert isinstance(dst, str), "dictionary value must be a string"
+
+            rules.append(PatchRule(src, dst, None, None))
+        return rules
+
+    assert isinstance(patches_json, list), "replacements must be a dictionary or a list"
+    return [PatchRule.from_json(x) for x in patches_json]
+
+
+def apply_patches(text: str, rules: list[PatchRule]):
+    """
+    Split the given USDocML text into blocs, then apply patch rules to them.
+
+    Global rules are applied to every part of the document first, then each scoped rule
+    is applied only to the bloc with the matching slug. Since blocs are split before any
+    rule is applied, their positions in the input file are preserved.
+    """
+
+    parts = RawBloc.split_text(text)
+
+    report: dict[int, PatchHit] = {}
+
+    for i, rule in enumerate(rules):
+        if rule.slug is not None:
+            continue
+
+        hits = 0
+        for j, x in enumerate(parts):
+            if isinstance(x, str):
+                parts[j], count = rule.apply(x)
+            else:
+                x.text, count = rule.apply(x.text)
+            hits += count
+
+        report[i] = PatchHit(rule, hits)
+
+    blocs: dict[str, RawBloc] = {}
+    for x in parts:
+        if isinstance(x, RawBloc) and x.slug is not None:
+            blocs[x.slug] = x
+
+    for i, rule in enumerate(rules):
+        if rule.slug is None:
+            continue
+
+        bloc = blocs.get(rule.slug)
+        if bloc is None:
+            report[i] = PatchHit(rule, 0)
+            continue
+
+        bloc.text, hits = rule.apply(bloc.text)
+        report[i] = PatchHit(rule, hits)
+
+    return parts, [report[i] for i in range(len(rules))]
@@ -0,0 +1,54 @@
+import json
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+
+class SourcePos(NamedTuple):
+    """A position in the input USDocML file"""
+
+    slug: Optional[str]
+    # 1-based line number
+    line: int
+    # 0-based byte offset in the UTF-8 encoded file
+    offset: int
+
+    def __str__(self) -> str:
+        if self.slug is None:
+            return f"line {self.line}, byte {self.offset}"
+        else:
+            return f"{self.slug} (line {self.line}, byte {self.offset})"
+
+
+class SourceMapping(NamedTuple):
+    """A range of lines in the output file, and the position it was generated from"""
+
+    # 1-based line numbers, inclusive
+    line: int
+    end_line: int
+    source: SourcePos
+
+    def to_json(self):
+        return {
+            "line": self.line,
+            "end_line": self.end_line,
+            "slug": self.source.slug,
+            "source_line": self.source.line,
+            "source_offset": self.source.offset,
+        }
+
+
+def write_source_map(
+    path: Path,
+    input_path: Path,
+    output_path: Path,
+    mappings: list[SourceMapping],
+):
+    source_map = {
+        "version": 1,
+        "file": output_path.name,
+        "source": input_path.name,
+        "mappings": [m.to_json() for m in mappings],
+    }
+
+    with open(path, "w", encoding="utf8") as f:
+        json.dump(source_map, f, indent=2)
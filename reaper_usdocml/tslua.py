@@ -1,6 +1,8 @@
 import textwrap
 from typing import Literal, NamedTuple, Optional, get_args
 
+from .source_map import SourceMapping, SourcePos
+
 PREAMBLE = """\
 // https://stackoverflow.com/questions/56737033/how-to-define-an-opaque-type-in-typescript
 declare const opaqueTypeTag: unique symbol;"""
@@ -15,10 +17,47 @@ NativeTSLuaType = Literal["string", "number", "boolean", "object", "Function"]
 NATIVE_TS_LUA_TYPES = frozenset(get_args(NativeTSLuaType))
 
 
+def native_type(lua_type: str) -> Optional[NativeTSLuaType]:
+    """Convert a standard Lua type to a TS type, returns None for custom types"""
+
+    if lua_type in {"int", "integer", "number"}:
+        return "number"
+    elif lua_type == "string":
+        return "string"
+    elif lua_type == "boolean":
+        return "boolean"
+    elif lua_type == "table":
+        return "object"
+    elif lua_type == "function":
+        return "Function"
+    else:
+        return None
+
+
+def sanitise_type_name(name: str) -> str:
+    return name.replace(".", "_")
+
+
+def sanitise_param_name(name: str) -> str:
+    if name in {"in", "function"}:
+        return f"_{name}"
+
+    return name.replace(".", "_")
+
+
+def to_docstring(parts: list[str]):
+    """Wrap paragraphs in a JSDoc comment, every line (even blank ones) gets a ' * '"""
+
+    docstring = "\n\n".join(parts)
+    docstring = textwrap.indent(docstring, " * ", lambda _: True)
+    return f"/**\n{docstring}\n */"
+
+
 class Param(NamedTuple):
     type: str
     name: str
     optional: bool
+    description: Optional[str] = None
 
     def declaration(self):
         return f"{self.name}{'?' if self.optional else ''}: {self.type}"
@@ -42,12 +81,45 @@ class FunctionDeclaration(NamedTuple):
     params: list[Param]
     return_types: list[str]
     varargs: bool
+    source: Optional[SourcePos] = None
+    # (name, description) of each documented return value
+    return_docs: Optional[list[tuple[str, str]]] = None
+
+    def doc_tags(self):
+        """JSDoc @param and @returns tags for the documented params and return values"""
+
+        tags = []
+
+        for p in self.params:
+            if p.description:
+                tags.append(f"@param {p.name} {p.description}")
+
+        if self.return_docs:
+            if len(self.return_types) == 1:
+                tags.append(f"@returns {self.return_docs[0][1]}")
+            else:
+                # indent continuation lines so they stay in the list item
+                items = [
+                    "- {}: {}".format(name, doc.replace("\n", "\n  "))
+                    for name, doc in self.return_docs
+                ]
+                tags.append("@returns\n{}".format("\n".join(items)))
+
+        return "\n".join(tags)
+
+    def location(self) -> str:
+        """The function name, and where it was generated from if known"""
+
+        if self.source is None:
+            return self.name
+        else:
+            return f"{self.name} ({self.source})"
 
     def function_declaration(self):
         try:
             Param.validate_order(self.params)
         except TranspileError as e:
-            print(f"[ERROR] invalid param order for: {self}")
+            print(f"[ERROR] invalid param order for: {self.location()}")
             raise e
 
         params = ", ".join([p.declaration() for p in self.params])
@@ -69,19 +141,15 @@ class FunctionDeclaration(NamedTuple):
         if self.description:
             docstring_parts.append(self.description)
 
+        doc_tags = self.doc_tags()
+        if doc_tags:
+            docstring_parts.append(doc_tags)
+
         if self.deprecated:
             docstring_parts.append(f"@deprecated {self.deprecated}")
 
         if len(docstring_parts) > 0:
-            docstring = "\n\n".join(docstring_parts)
-            docstring = "/**\n{}\n */".format(
-                textwrap.indent(
-                    docstring,
-                    " * ",
-                    lambda _: True,
-                )
-            )
-            return f"{docstring}\n{functioncall}"
+            return f"{to_docstring(docstring_parts)}\n{functioncall}"
         else:
             return functioncall
 
@@ -89,7 +157,7 @@ class FunctionDeclaration(NamedTuple):
         try:
             Param.validate_order(self.params)
         except TranspileError as e:
-            print(f"[ERROR] invalid param order for: {self}")
+            print(f"[ERROR] invalid param order for: {self.location()}")
             raise e
 
         params = ", ".join([p.declaration() for p in self.params])
@@ -106,13 +174,22 @@ class FunctionDeclaration(NamedTuple):
 
         functioncall = f"{self.name}({params}): {return_type};"
 
-        if self.description:
-            docstring = "/**\n{}\n */".format(textwrap.indent(self.description, " * "))
-            return f"{docstring}\n{functioncall}"
+        docstring_parts = [x for x in (self.description, self.doc_tags()) if x]
+
+        if len(docstring_parts) > 0:
+            return f"{to_docstring(docstring_parts)}\n{functioncall}"
         else:
             return functioncall
 
 
+class MethodOffset(NamedTuple):
+    """A rendered method, and the 0-based line it starts on within its class"""
+
+    line: int
+    text: str
+    method: FunctionDeclaration
+
+
 class CustomType(NamedTuple):
     name: str
     methods: list[FunctionDeclaration]
@@ -121,18 +198,35 @@ class CustomType(NamedTuple):
         return self.name
 
     def declaration(self):
+        return self.declaration_with_offsets()[0]
+
+    def declaration_with_offsets(self):
+        """Returns the declaration, and a MethodOffset for each method in it"""
+
         if len(self.methods) == 0:
-            return f"declare type {self.name} = {{ readonly [opaqueTypeTag]: '{self.name}' }};"
-        else:
-            methods = "\n\n".join([m.method_declaration() for m in self.methods])
-            methods = textwrap.indent(methods, "  ")
-            return (
-                f"declare class {self.name} {{\n"
-                "  private constructor();\n"
-                "\n"
-                f"{methods}\n"
-                "}"
+            declaration = (
+                f"declare type {self.name} = {{ readonly [opaqueTypeTag]: '{self.name}' }};"
             )
+            return declaration, []
+
+        # methods start after the class header and private constructor
+        offsets: list[MethodOffset] = []
+        line = 3
+        for m in self.methods:
+            method = m.method_declaration()
+            offsets.append(MethodOffset(line, method, m))
+            line += method.count("\n") + 2
+
+        methods = "\n\n".join([x.text for x in offsets])
+        methods = textwrap.indent(methods, "  ")
+        declaration = (
+            f"declare class {self.name} {{\n"
+            "  private constructor();\n"
+            "\n"
+            f"{methods}\n"
+            "}"
+        )
+        return declaration, offsets
 
 
 class Namespace(NamedTuple):
@@ -141,11 +235,42 @@ class Namespace(NamedTuple):
 
 
 def to_typescriptlua(custom_types: list[CustomType], namespaces: list[Namespace]):
-    parts = [PREAMBLE]
+    """
+    Returns the declaration file, and a mapping from each declaration's lines to the
+    position it was generated from
+    """
+
+    parts = []
+    mappings: list[SourceMapping] = []
+
+    # 1-based line number of the next part, parts are separated by a blank line
+    next_line = 1
+
+    def add_part(part: str):
+        nonlocal next_line
+
+        start_line = next_line
+        parts.append(part)
+        next_line += part.count("\n") + 2
+        return start_line
+
+    def add_mapping(line: int, declaration: str, f: FunctionDeclaration):
+        if f.source is not None:
+            end_line = line + declaration.count("\n")
+            mappings.append(SourceMapping(line, end_line, f.source))
+
+    add_part(PREAMBLE)
 
     # generate type declarations
-    type_declarations = "\n".join([x.declaration() for x in sorted(custom_types)])
-    parts.append(type_declarations)
+    type_declarations = []
+    type_line = next_line
+    for x in sorted(custom_types):
+        declaration, offsets = x.declaration_with_offsets()
+        type_declarations.append(declaration)
+        for m in offsets:
+            add_mapping(type_line + m.line, m.text, m.method)
+        type_line += declaration.count("\n") + 1
+    add_part("\n".join(type_declarations))
 
     custom_types_names: dict[str, CustomType] = {}
     for ct in custom_types:
@@ -162,15 +287,16 @@ def to_typescriptlua(custom_types: list[CustomType], namespaces: list[Namespace]
     # generate namespaces
     for namespace in namespaces:
         # convert functions to ts
-        namespace_functions = []
+        namespace_functions: list[tuple[str, FunctionDeclaration]] = []
         for f in namespace.functions:
             try:
-                namespace_functions.append(f.function_declaration())
+                namespace_functions.append((f.function_declaration(), f))
             except TranspileError as e:
-                print(f"[ERROR] {e}")
+                if f.source is None:
+                    print(f"[ERROR] {e}")
+                else:
+                    print(f"[ERROR] {f.source}: {e}")
                 continue
-        namespace_functions = "\n\n".join(namespace_functions)
-        namespace_functions = textwrap.indent(namespace_functions, "  ")
 
         # validate that param/retval types are valid
         for f in namespace.functions:
@@ -179,12 +305,21 @@ def to_typescriptlua(custom_types: list[CustomType], namespaces: list[Namespace]
             for rt in f.return_types:
                 validate_type(f, rt)
 
+        functions_ts = "\n\n".join([x for x, _ in namespace_functions])
+        functions_ts = textwrap.indent(functions_ts, "  ")
+
         namespace_ts = (
             "/** @noSelf */\n"
             f"declare namespace {namespace.name} {{\n"
-            f"{namespace_functions}\n"
+            f"{functions_ts}\n"
             "}"
         )
-        parts.append(namespace_ts)
+        start_line = add_part(namespace_ts)
+
+        # functions start after the namespace header
+        line = start_line + 2
+        for declaration, f in namespace_functions:
+            add_mapping(line, declaration, f)
+            line += declaration.count("\n") + 2
 
-    return "\n\n".join(parts)
+    return "\n\n".join(parts), mappings